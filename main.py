@@ -3,11 +3,13 @@ import logging
 import asyncio
 import re
 import shutil
-import json
+import time
+from stat import S_ISREG
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, List, Dict
-import hashlib
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
+import secrets
 
 from fastapi import FastAPI, Form, HTTPException, Request, BackgroundTasks
 from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
@@ -15,7 +17,11 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
 import yt_dlp
+import orjson
+import aiofiles
+import anyio
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -60,15 +66,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Only compress larger responses; small JSON isn't worth the CPU per request.
+# Media from /media is served as octet-stream and is already compressed.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=8192,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/octet-stream",)
+)
 
 # Configuration
 DOWNLOAD_FOLDER = os.getenv("DOWNLOAD_FOLDER", "downloads")
-HISTORY_FILE = os.path.join(DOWNLOAD_FOLDER, ".history.json")
+HISTORY_FILE = os.path.join(DOWNLOAD_FOLDER, ".history.jsonl")
+LEGACY_HISTORY_FILE = os.path.join(DOWNLOAD_FOLDER, ".history.json")
 MAX_FILE_AGE_DAYS = int(os.getenv("MAX_FILE_AGE_DAYS", "1"))
+CLEANUP_INTERVAL = max(3600, MAX_FILE_AGE_DAYS * 86400 // 4)
 MAX_HISTORY_ITEMS = int(os.getenv("MAX_HISTORY_ITEMS", "100"))
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "4"))
+MAX_QUEUED_DOWNLOADS = int(os.getenv("MAX_QUEUED_DOWNLOADS", "16"))
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "5"))
 PORT = int(os.getenv("PORT", "8000"))
 
+# Prefix for building file paths inside the download folder
+_DL_PREFIX = os.fspath(Path(DOWNLOAD_FOLDER)) + os.sep
+
 # Create necessary directories
 Path(DOWNLOAD_FOLDER).mkdir(exist_ok=True)
 Path("templates").mkdir(exist_ok=True)
@@ -76,45 +96,113 @@ Path("templates").mkdir(exist_ok=True)
 # Mount templates
 templates = Jinja2Templates(directory="templates")
 
+# Keep references to background tasks so they aren't garbage collected
+_background_tasks = set()
+
+def start_background_task(coro):
+    """Schedule a coroutine and track it until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# Limit how many yt-dlp downloads run at once
+DOWNLOAD_SEM = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+_pending_downloads = 0
+
 # Download history management
-def load_history() -> List[Dict]:
-    """Load download history from file"""
-    try:
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading history: {e}")
-    return []
+# History is stored as newline-delimited JSON so new entries are appended in O(1);
+# an in-memory copy serves reads and the file is compacted once it grows too long
+_history: Optional[List[Dict]] = None
+_history_lines = 0
+_history_lock = asyncio.Lock()
 
-def save_history(history: List[Dict]):
-    """Save download history to file"""
+async def load_history() -> List[Dict]:
+    """Load download history (read from file on first access only)"""
+    global _history, _history_lines
+    if _history is None:
+        history = []
+        lines = 0
+        try:
+            if await anyio.Path(HISTORY_FILE).exists():
+                async with aiofiles.open(HISTORY_FILE, 'rb') as f:
+                    data = await f.read()
+                for line in data.splitlines():
+                    if line.strip():
+                        lines += 1
+                        try:
+                            history.append(orjson.loads(line))
+                        except orjson.JSONDecodeError:
+                            logger.warning("⚠️  Skipping corrupt history entry")
+            elif await anyio.Path(LEGACY_HISTORY_FILE).exists():
+                # Migrate the old single-array JSON history file
+                async with aiofiles.open(LEGACY_HISTORY_FILE, 'rb') as f:
+                    history = orjson.loads(await f.read())
+        except Exception as e:
+            logger.error(f"Error loading history: {e}")
+        # Another request may have populated the cache while we were reading
+        if _history is None:
+            _history = history[-MAX_HISTORY_ITEMS:]
+            _history_lines = lines
+            if lines > 2 * MAX_HISTORY_ITEMS or (history and not lines):
+                await save_history(_history)
+    return _history
+
+async def save_history(history: List[Dict]):
+    """Replace download history and rewrite the file"""
+    global _history, _history_lines
+    # Keep only last MAX_HISTORY_ITEMS
+    _history = history[-MAX_HISTORY_ITEMS:]
     try:
-        # Keep only last MAX_HISTORY_ITEMS
-        history = history[-MAX_HISTORY_ITEMS:]
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
+        async with _history_lock:
+            async with aiofiles.open(HISTORY_FILE, 'wb') as f:
+                await f.write(b''.join(orjson.dumps(entry) + b'\n' for entry in _history))
+            _history_lines = len(_history)
     except Exception as e:
         logger.error(f"Error saving history: {e}")
 
-def add_to_history(data: Dict):
+async def add_to_history(data: Dict):
     """Add item to download history"""
-    history = load_history()
-    history.append({
+    global _history_lines
+    history = await load_history()
+    entry = {
         **data,
         'timestamp': datetime.now().isoformat(),
-        'id': hashlib.md5(str(datetime.now().timestamp()).encode()).hexdigest()[:8]
-    })
-    save_history(history)
+        'id': secrets.token_hex(4)
+    }
+    history.append(entry)
+    del history[:-MAX_HISTORY_ITEMS]
+    
+    # Compact the file once it holds twice as many lines as we keep
+    if _history_lines >= 2 * MAX_HISTORY_ITEMS:
+        await save_history(history)
+        return
+    
+    try:
+        async with _history_lock:
+            async with aiofiles.open(HISTORY_FILE, 'ab') as f:
+                await f.write(orjson.dumps(entry) + b'\n')
+            _history_lines += 1
+    except Exception as e:
+        logger.error(f"Error saving history: {e}")
+
+# Translation table for sanitize_filename: drop unsafe and control characters,
+# map whitespace to underscores (every Unicode whitespace code point is <= U+3000)
+_UNSAFE_CHARS = '<>:"/\\|?*' + ''.join(map(chr, range(0x20))) + ''.join(map(chr, range(0x7f, 0xa0)))
+_FILENAME_TRANS = str.maketrans({
+    **{c: '_' for c in range(0x3001) if chr(c).isspace()},
+    **{ord(c): None for c in _UNSAFE_CHARS},
+})
 
 def sanitize_filename(filename: str, max_length: int = 100) -> str:
     """Sanitize filename to be safe across all operating systems"""
     # Remove or replace problematic characters
-    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-    filename = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', filename)
-    filename = re.sub(r'\s+', '_', filename)
-    filename = re.sub(r'\.+', '.', filename)
-    filename = re.sub(r'_+', '_', filename)
+    filename = filename.translate(_FILENAME_TRANS)
+    # Collapse runs of dots and underscores
+    while '..' in filename:
+        filename = filename.replace('..', '.')
+    while '__' in filename:
+        filename = filename.replace('__', '_')
     filename = filename.strip('._')
     
     # Limit length
@@ -131,63 +219,94 @@ def clean_old_files():
         cutoff = now - timedelta(days=MAX_FILE_AGE_DAYS)
         deleted_count = 0
         
-        for file_path in Path(DOWNLOAD_FOLDER).glob("*"):
-            if file_path.is_file() and not file_path.name.startswith('.'):
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff:
-                    file_path.unlink()
-                    deleted_count += 1
+        with os.scandir(DOWNLOAD_FOLDER) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    file_time = datetime.fromtimestamp(entry.stat().st_mtime)
+                    if file_time < cutoff:
+                        os.unlink(entry.path)
+                        deleted_count += 1
         
         if deleted_count > 0:
+            invalidate_stats()
             logger.info(f"🗑️  Cleaned up {deleted_count} old file(s)")
     except Exception as e:
         logger.error(f"Error cleaning old files: {str(e)}")
 
+async def _warm_history():
+    """Load history in the background so startup doesn't wait on it"""
+    history = await load_history()
+    logger.info(f"📊 History loaded: {len(history)} items")
+
+async def _periodic_cleanup():
+    """Remove old files now and then every CLEANUP_INTERVAL seconds"""
+    while True:
+        await asyncio.to_thread(clean_old_files)
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+_QUALITY_MAP = {
+    "best": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
+    "high": "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best",
+    "medium": "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best",
+    "low": "bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best"
+}
+
+@lru_cache(maxsize=32)
 def get_format_string(quality: str, format_type: str) -> str:
     """Get yt-dlp format string based on quality and format type"""
     if format_type == "audio":
         return "bestaudio/best"
     
-    quality_map = {
-        "best": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-        "high": "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best",
-        "medium": "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best",
-        "low": "bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best"
-    }
-    
-    return quality_map.get(quality, "best")
+    return _QUALITY_MAP.get(quality, "best")
+
+# Shared across downloads; yt-dlp copies it and never mutates it
+_COMMON_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Accept-Encoding': 'gzip,deflate',
+    'Connection': 'keep-alive',
+}
 
 def get_common_headers():
     """Get common headers to avoid bot detection"""
-    return {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-us,en;q=0.5',
-        'Accept-Encoding': 'gzip,deflate',
-        'Connection': 'keep-alive',
-    }
+    return _COMMON_HEADERS
+
+# Platform detection: one case-insensitive scan over all known domains
+_PLATFORM_MAP = {
+    'youtube.com': 'YouTube',
+    'youtu.be': 'YouTube',
+    'tiktok.com': 'TikTok',
+    'instagram.com': 'Instagram',
+    'twitter.com': 'Twitter/X',
+    'x.com': 'Twitter/X',
+    'facebook.com': 'Facebook',
+    'fb.watch': 'Facebook',
+    'vimeo.com': 'Vimeo',
+    'reddit.com': 'Reddit',
+    'twitch.tv': 'Twitch',
+}
+_PLATFORM_RE = re.compile('|'.join(re.escape(domain) for domain in _PLATFORM_MAP), re.IGNORECASE)
 
+@lru_cache(maxsize=512)
 def get_platform_from_url(url: str) -> str:
     """Detect platform from URL"""
-    url_lower = url.lower()
-    if 'youtube.com' in url_lower or 'youtu.be' in url_lower:
-        return 'YouTube'
-    elif 'tiktok.com' in url_lower:
-        return 'TikTok'
-    elif 'instagram.com' in url_lower:
-        return 'Instagram'
-    elif 'twitter.com' in url_lower or 'x.com' in url_lower:
-        return 'Twitter/X'
-    elif 'facebook.com' in url_lower or 'fb.watch' in url_lower:
-        return 'Facebook'
-    elif 'vimeo.com' in url_lower:
-        return 'Vimeo'
-    elif 'reddit.com' in url_lower:
-        return 'Reddit'
-    elif 'twitch.tv' in url_lower:
-        return 'Twitch'
-    else:
-        return 'Other'
+    match = _PLATFORM_RE.search(url)
+    return _PLATFORM_MAP.get(match.group(0).lower(), 'Other') if match else 'Other'
+
+def _do_download(url: str, ydl_opts: Dict, format_type: str) -> Tuple[Dict, str]:
+    """Run a blocking yt-dlp download and return its info dict and output filename"""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        logger.info("⏳ Extracting video information...")
+        info = ydl.extract_info(url, download=True)
+        
+        # Get filename
+        if format_type == "audio":
+            filename = os.path.splitext(ydl.prepare_filename(info))[0] + '.mp3'
+        else:
+            filename = ydl.prepare_filename(info)
+        
+        return info, filename
 
 @app.on_event("startup")
 async def startup_event():
@@ -199,12 +318,19 @@ async def startup_event():
     logger.info(f"🗑️  Auto-cleanup: {MAX_FILE_AGE_DAYS} day(s)")
     logger.info(f"📜 Max history: {MAX_HISTORY_ITEMS} items")
     logger.info(f"🌐 Port: {PORT}")
-    clean_old_files()
-    history = load_history()
-    logger.info(f"📊 History loaded: {len(history)} items")
+    start_background_task(_warm_history())
+    start_background_task(_periodic_cleanup())
     logger.info("✅ Application ready!")
     logger.info("=" * 70)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Run on application shutdown"""
+    for task in list(_background_tasks):
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    logger.info("👋 Application stopped")
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the main page"""
@@ -221,33 +347,55 @@ async def health_check():
         "features": ["download", "history", "stats", "dark_mode"]
     }
 
+def _scan_folder_stats() -> Dict:
+    """Count files, total size and free space in the download folder"""
+    total_files = 0
+    total_size = 0
+    with os.scandir(DOWNLOAD_FOLDER) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.startswith('.'):
+                total_files += 1
+                total_size += entry.stat().st_size
+    
+    # Get available space
+    try:
+        stat = os.statvfs(DOWNLOAD_FOLDER)
+        available_space = stat.f_bavail * stat.f_frsize / (1024 * 1024)
+    except (AttributeError, OSError):
+        try:
+            stat = shutil.disk_usage(DOWNLOAD_FOLDER)
+            available_space = stat.free / (1024 * 1024)
+        except Exception:
+            available_space = 0
+    
+    return {
+        "total_downloads": total_files,
+        "total_size_mb": round(total_size / (1024 * 1024), 2),
+        "available_space_mb": round(available_space, 2),
+    }
+
+# Folder stats are cached briefly since the page polls /stats;
+# anything that adds or removes files resets the cache
+_stats_cache = {'t': 0.0, 'v': None}
+
+def invalidate_stats():
+    """Force the next /stats request to rescan the download folder"""
+    _stats_cache['v'] = None
+
 @app.get("/stats")
 async def get_stats():
     """Get comprehensive download statistics"""
     try:
-        files = list(Path(DOWNLOAD_FOLDER).glob("*"))
-        file_list = [f for f in files if f.is_file() and not f.name.startswith('.')]
-        total_files = len(file_list)
-        total_size = sum(f.stat().st_size for f in file_list)
-        
-        # Get available space
-        try:
-            stat = os.statvfs(DOWNLOAD_FOLDER)
-            available_space = stat.f_bavail * stat.f_frsize / (1024 * 1024)
-        except (AttributeError, OSError):
-            try:
-                stat = shutil.disk_usage(DOWNLOAD_FOLDER)
-                available_space = stat.free / (1024 * 1024)
-            except Exception:
-                available_space = 0
+        now = time.monotonic()
+        if _stats_cache['v'] is None or now - _stats_cache['t'] >= STATS_CACHE_TTL:
+            _stats_cache.update(t=now, v=_scan_folder_stats())
+        folder_stats = _stats_cache['v']
         
         # Get history stats
-        history = load_history()
+        history = await load_history()
         
         return {
-            "total_downloads": total_files,
-            "total_size_mb": round(total_size / (1024 * 1024), 2),
-            "available_space_mb": round(available_space, 2),
+            **folder_stats,
             "history_count": len(history),
             "last_download": history[-1]['timestamp'] if history else None
         }
@@ -265,7 +413,7 @@ async def get_stats():
 async def get_history(limit: int = 50):
     """Get download history"""
     try:
-        history = load_history()
+        history = await load_history()
         return {"history": history[-limit:][::-1]}  # Latest first
     except Exception as e:
         logger.error(f"Error getting history: {str(e)}")
@@ -275,7 +423,7 @@ async def get_history(limit: int = 50):
 async def clear_history():
     """Clear download history"""
     try:
-        save_history([])
+        await save_history([])
         logger.info("🗑️  History cleared")
         return {"success": True, "message": "History cleared successfully"}
     except Exception as e:
@@ -296,6 +444,16 @@ async def download_media(
         logger.warning(f"❌ Invalid URL format: {url}")
         raise HTTPException(status_code=400, detail="URL must start with http:// or https://")
     
+    # Reject when all download slots are busy and the queue is full
+    global _pending_downloads
+    if DOWNLOAD_SEM.locked() and _pending_downloads >= MAX_CONCURRENT_DOWNLOADS + MAX_QUEUED_DOWNLOADS:
+        logger.warning(f"⚠️  Download queue full ({_pending_downloads} pending)")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many downloads in progress, please try again later",
+            headers={"Retry-After": "30"}
+        )
+    
     platform = get_platform_from_url(url)
     
     logger.info("=" * 80)
@@ -306,7 +464,7 @@ async def download_media(
     logger.info(f"📼 Format: {format_type}")
     
     # Configure filename
-    timestamp = int(datetime.now().timestamp())
+    timestamp = int(time.time())
     filename_template = f"{timestamp}_%(title).100s.%(ext)s"
     
     # Get format string
@@ -315,7 +473,7 @@ async def download_media(
     # Configure yt-dlp options
     ydl_opts = {
         'format': format_string,
-        'outtmpl': os.path.join(DOWNLOAD_FOLDER, filename_template),
+        'outtmpl': _DL_PREFIX + filename_template,
         'restrictfilenames': True,
         'windowsfilenames': True,
         'no_warnings': False,
@@ -353,85 +511,80 @@ async def download_media(
             }],
         })
     
+    _pending_downloads += 1
     try:
-        # Download using yt-dlp
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info("⏳ Extracting video information...")
-            info = ydl.extract_info(url, download=True)
-            
-            # Get filename
-            if format_type == "audio":
-                base_filename = ydl.prepare_filename(info)
-                filename = base_filename.rsplit('.', 1)[0] + '.mp3'
-            else:
-                filename = ydl.prepare_filename(info)
-            
-            basename = os.path.basename(filename)
-            basename = sanitize_filename(basename)
-            
-            # Get metadata
-            title = (info.get('title') or 'Unknown')[:150]
-            uploader = (info.get('uploader') or 'Unknown')[:100]
-            duration = info.get('duration') or 0
-            thumbnail = info.get('thumbnail') or ''
-            view_count = info.get('view_count') or 0
-            
-            # Get quality info
-            if format_type == "video":
-                height = info.get('height') or 0
-                width = info.get('width') or 0
-                fps = info.get('fps') or 0
-                if height and width:
-                    quality_info = f"{width}x{height}"
-                    if fps:
-                        quality_info += f" @{fps}fps"
-                else:
-                    quality_info = "Unknown"
+        # Download using yt-dlp in a worker thread to keep the event loop free
+        async with DOWNLOAD_SEM:
+            info, filename = await asyncio.to_thread(_do_download, url, ydl_opts, format_type)
+        
+        basename = os.path.basename(filename)
+        basename = sanitize_filename(basename)
+        
+        # Get metadata
+        title = (info.get('title') or 'Unknown')[:150]
+        uploader = (info.get('uploader') or 'Unknown')[:100]
+        duration = info.get('duration') or 0
+        thumbnail = info.get('thumbnail') or ''
+        view_count = info.get('view_count') or 0
+        
+        # Get quality info
+        if format_type == "video":
+            height = info.get('height') or 0
+            width = info.get('width') or 0
+            fps = info.get('fps') or 0
+            if height and width:
+                quality_info = f"{width}x{height}"
+                if fps:
+                    quality_info += f" @{fps}fps"
             else:
-                quality_info = "MP3 Audio (192kbps)"
-            
-            # Get file size
-            filesize = info.get('filesize') or info.get('filesize_approx') or 0
-            filesize_mb = round(filesize / (1024 * 1024), 2) if filesize > 0 else 0
-            
-            logger.info("✅ Download successful!")
-            logger.info(f"📄 Filename: {basename}")
-            logger.info(f"🎬 Title: {title[:50]}...")
-            logger.info(f"📊 Quality: {quality_info}")
-            logger.info(f"💾 Size: {filesize_mb} MB")
-            logger.info("=" * 80)
-            
-            # Add to history
-            history_entry = {
-                'url': url,
-                'title': title,
-                'filename': basename,
-                'platform': platform,
-                'quality': quality_info,
-                'format': format_type,
-                'size_mb': filesize_mb,
-                'duration': duration
+                quality_info = "Unknown"
+        else:
+            quality_info = "MP3 Audio (192kbps)"
+        
+        # Get file size
+        filesize = info.get('filesize') or info.get('filesize_approx') or 0
+        filesize_mb = round(filesize / (1024 * 1024), 2) if filesize > 0 else 0
+        
+        logger.info("✅ Download successful!")
+        logger.info(f"📄 Filename: {basename}")
+        logger.info(f"🎬 Title: {title[:50]}...")
+        logger.info(f"📊 Quality: {quality_info}")
+        logger.info(f"💾 Size: {filesize_mb} MB")
+        logger.info("=" * 80)
+        
+        invalidate_stats()
+        
+        # Add to history
+        history_entry = {
+            'url': url,
+            'title': title,
+            'filename': basename,
+            'platform': platform,
+            'quality': quality_info,
+            'format': format_type,
+            'size_mb': filesize_mb,
+            'duration': duration
+        }
+        await add_to_history(history_entry)
+        
+        return JSONResponse({
+            "success": True,
+            "message": "Download completed successfully",
+            "filename": basename,
+            "download_url": f"/media/{basename}",
+            "metadata": {
+                "title": title,
+                "uploader": uploader,
+                "duration": duration,
+                "thumbnail": thumbnail,
+                "quality": quality_info,
+                "format_type": format_type,
+                "filesize": filesize,
+                "platform": platform,
+                "views": view_count
             }
-            add_to_history(history_entry)
-            
-            return JSONResponse({
-                "success": True,
-                "message": "Download completed successfully",
-                "filename": basename,
-                "download_url": f"/media/{basename}",
-                "metadata": {
-                    "title": title,
-                    "uploader": uploader,
-                    "duration": duration,
-                    "thumbnail": thumbnail,
-                    "quality": quality_info,
-                    "format_type": format_type,
-                    "filesize": filesize,
-                    "platform": platform,
-                    "views": view_count
-                }
-            })
-            
+        })
+        
     except yt_dlp.utils.DownloadError as e:
         error_msg = str(e)
         logger.error(f"❌ Download error: {error_msg}")
@@ -442,14 +595,23 @@ async def download_media(
         logger.error(f"❌ Unexpected error: {error_msg}")
         logger.error("=" * 80)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {error_msg}")
+    finally:
+        _pending_downloads -= 1
 
 @app.get("/media/{filename}")
 async def serve_media(filename: str):
     """Serve downloaded media files"""
     filename = os.path.basename(filename)
-    file_path = os.path.join(DOWNLOAD_FOLDER, filename)
+    file_path = _DL_PREFIX + filename
+    
+    # Stat once here and hand the result to FileResponse so it doesn't stat again
+    try:
+        stat_result = await anyio.Path(file_path).stat()
+    except OSError:
+        stat_result = None
     
-    if not os.path.exists(file_path):
+    # FileResponse skips its own regular-file check when given a stat_result
+    if stat_result is None or not S_ISREG(stat_result.st_mode):
         logger.warning(f"⚠️  File not found: {filename}")
         raise HTTPException(status_code=404, detail="File not found")
     
@@ -458,6 +620,7 @@ async def serve_media(filename: str):
         file_path,
         media_type="application/octet-stream",
         filename=filename,
+        stat_result=stat_result,
         headers={
             "Cache-Control": "public, max-age=3600",
             "Content-Disposition": f'attachment; filename="{filename}"'
@@ -468,13 +631,14 @@ async def serve_media(filename: str):
 async def delete_media(filename: str):
     """Delete a specific media file"""
     filename = os.path.basename(filename)
-    file_path = os.path.join(DOWNLOAD_FOLDER, filename)
+    file_path = _DL_PREFIX + filename
     
-    if not os.path.exists(file_path):
+    if not await anyio.Path(file_path).exists():
         raise HTTPException(status_code=404, detail="File not found")
     
     try:
-        os.remove(file_path)
+        await anyio.Path(file_path).unlink()
+        invalidate_stats()
         logger.info(f"🗑️  Deleted file: {filename}")
         return {"success": True, "message": f"File deleted successfully"}
     except Exception as e:
@@ -486,15 +650,16 @@ async def list_downloads():
     """List all downloaded files"""
     try:
         files = []
-        for file_path in Path(DOWNLOAD_FOLDER).glob("*"):
-            if file_path.is_file() and not file_path.name.startswith('.'):
-                stat = file_path.stat()
-                files.append({
-                    "filename": file_path.name,
-                    "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "download_url": f"/media/{file_path.name}"
-                })
+        with os.scandir(DOWNLOAD_FOLDER) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    files.append({
+                        "filename": entry.name,
+                        "size_mb": round(stat.st_size / (1024 * 1024), 2),
+                        "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                        "download_url": f"/media/{entry.name}"
+                    })
         
         return {"files": sorted(files, key=lambda x: x['created'], reverse=True)}
     except Exception as e:
@@ -505,7 +670,7 @@ async def list_downloads():
 async def cleanup_old_files():
     """Manually trigger cleanup of old files"""
     try:
-        clean_old_files()
+        await asyncio.to_thread(clean_old_files)
         return {"success": True, "message": "Cleanup completed"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))